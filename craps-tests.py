@@ -1,8 +1,22 @@
 ''' Craps module tests. '''
 
 import unittest
+import json
+import os
 import random
+import shutil
+import tempfile
+import warnings
+import numpy as np
+from fractions import Fraction
 from craps import *
+from craps_population import Population
+from craps_conformance import *
+from craps_cache import ResultsCache, aggregate, simulate
+from craps_trace import Tracer, TraceReader, ROLL, BET, PAYOUT, UNKNOWN
+from craps_odds import odds_table, odds_tables, house_edge, \
+                      round_distribution
+from craps_bands import BandAggregator, Sketch
 
 class TestBetMethods(unittest.TestCase):
     def test_bet_amount_exceptions(self):
@@ -12,6 +26,30 @@ class TestBetMethods(unittest.TestCase):
         with self.assertRaises(ValueError):
             Bet('pass',-20)
 
+    def test_bet_whole_units(self):
+        ''' Test exception raised when bet amount is not whole units '''
+        with self.assertRaises(ValueError):
+            Bet('pass',5.5)
+        self.assertIs(type(Bet('pass',5.0).amount), int)
+        with self.assertRaises(ValueError):
+            Board(2.5)
+
+    def test_odds_payout_rounding(self):
+        ''' 6:5 odds on 7 pay 8.4, rounded down to 8 '''
+        board = Board()
+        board.roll(6)
+        board.roll(6)
+        self.assertEqual(pass_odds_get_payout(board, Bet('pass_odds',7)),
+                         7 + 8)
+        self.assertEqual(pass_odds_get_payout(board, Bet('pass_odds',10)),
+                         10 + 12)
+
+    def test_odds_bet_amount(self):
+        self.assertEqual(odds_bet_amount(7, 6), 10)
+        self.assertEqual(odds_bet_amount(7, 5), 8)
+        self.assertEqual(odds_bet_amount(7, 4), 7)
+        self.assertEqual(odds_bet_amount(5, 9), 6)
+
 class TestBoardMethods(unittest.TestCase):
     ''' Test roll() in the board '''
     def test_roll(self):
@@ -510,6 +548,514 @@ class TestFullScenario(unittest.TestCase):
         self.assertLessEqual(player.log.num_rounds,player.log.num_bets)
         self.assertGreaterEqual(abs(player.log.winnings_history[-1]),50)
 
+class TestSnapshot(unittest.TestCase):
+
+    def play_rounds(self, board, player, rolls):
+        for roll in rolls:
+            board.take_bets(player.make_bets(board.get_status()))
+            board.roll(roll)
+            if board.round_is_over:
+                player.get_payouts(board.return_payouts())
+
+    def test_forked_log_shares_history(self):
+        player = Player(bets_pass, quits_after_N_rounds)
+        player.N = 10
+        board = Board()
+        self.play_rounds(board, player, [7, 11, 2])
+        forked_board, forked_player = Snapshot(board, player).fork()
+        self.assertEqual(forked_player.log.winnings_history, [5, 10, 5])
+        self.assertIs(forked_player.log.winnings_history.root,
+                      player.log.winnings_history)
+        self.play_rounds(forked_board, forked_player, [7])
+        self.play_rounds(board, player, [3])
+        self.assertEqual(forked_player.log.winnings_history, [5, 10, 5, 10])
+        self.assertEqual(player.log.winnings_history, [5, 10, 5, 0])
+        self.assertEqual(len(forked_player.log.winnings_history),
+                         forked_player.log.num_rounds)
+        self.assertEqual(forked_player.log.winnings_history[-2:], [5, 10])
+        self.assertEqual(forked_player.N, 10)
+
+    def test_repeated_forks(self):
+        ''' Snapshot the forked player after every round '''
+        player = Player(bets_pass, quits_after_N_rounds)
+        player.N = 5000
+        board = Board()
+        for ii in range(5000):
+            self.play_rounds(board, player, [7 if ii % 3 else 2])
+            board, player = Snapshot(board, player).fork()
+        history = player.log.winnings_history
+        self.assertEqual(len(history), 5000)
+
+        ''' Every fork appended to one shared list; nothing was copied '''
+        self.assertEqual(len(history.entries), 4999)
+        self.assertEqual(history.offset, 1)
+        self.assertEqual(history[-1], player.winnings)
+        self.assertEqual(history[:3], [-5, 0, 5])
+        bands = BandAggregator(5000)
+        bands.add_player(player)
+        self.assertEqual(bands.means()[-1], player.winnings)
+
+    def test_forks_diverge(self):
+        player = Player(bets_pass, quits_after_N_rounds)
+        board = Board()
+        self.play_rounds(board, player, [7])
+        board, player = Snapshot(board, player).fork()
+        self.play_rounds(board, player, [7])
+        snapshot = Snapshot(board, player)
+        first_board, first = snapshot.fork()
+        second_board, second = snapshot.fork()
+        self.play_rounds(first_board, first, [7, 7])
+        self.play_rounds(second_board, second, [2])
+        self.play_rounds(first_board, first, [7])
+        self.assertEqual(first.log.winnings_history, [5, 10, 15, 20, 25])
+        self.assertEqual(second.log.winnings_history, [5, 10, 5])
+        self.assertEqual(snapshot.fork()[1].log.winnings_history, [5, 10])
+        self.assertEqual(second.log.winnings_history + [0], [5, 10, 5, 0])
+        self.assertEqual(json.dumps(second.log.winnings_history.copy()),
+                         '[5, 10, 5]')
+
+        ''' The original log keeps a plain list '''
+        self.assertEqual(type(Player(bets_pass, quits_after_one)
+                              .log.winnings_history), list)
+
+    def test_fork_mid_round(self):
+        player = Player(bets_pass_and_odds, quits_after_one)
+        board = Board()
+        self.play_rounds(board, player, [4])
+        snapshot = Snapshot(board, player)
+        forked_board, forked_player = snapshot.fork()
+        self.play_rounds(forked_board, forked_player, [4])
+        self.assertEqual(forked_player.winnings, 5 + 10)
+        self.assertEqual(board.point, 4)
+        self.assertEqual(player.winnings, -5)
+        self.assertEqual(len(snapshot.fork()[0].bets), 1)
+
+    def test_evaluate_decisions(self):
+        ''' Point of 4 just set, and the player quits after this round '''
+        player = Player(bets_pass, quits_after_one)
+        board = Board()
+        self.play_rounds(board, player, [4])
+        results = evaluate_decisions(Snapshot(board, player),
+                                     {'odds': bets_pass_and_odds,
+                                      'no odds': bets_pass}, 100)
+        self.assertEqual(len(results['odds']), 100)
+
+        ''' Same dice for both: the odds either win 2:1 or lose '''
+        for odds, no_odds in zip(results['odds'], results['no odds']):
+            self.assertIn(odds - no_odds, [10, -5])
+        self.assertEqual(player.log.num_bets, 1)
+
+class TestResultsCache(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_hit(self):
+        cache = ResultsCache(self.directory)
+        first = cache.get(bets_pass, quits_after_N_rounds, 20, {'N': 5})
+        second = cache.get(bets_pass, quits_after_N_rounds, 20, {'N': 5})
+        self.assertEqual((cache.misses, cache.hits), (1, 1))
+        self.assertEqual(first, second)
+        self.assertEqual(first['aggregates']['num_rounds']['mean'], 5)
+
+        ''' Different parameters are a different study '''
+        cache.get(bets_pass, quits_after_N_rounds, 20, {'N': 6})
+        self.assertEqual(cache.misses, 2)
+
+    def test_extension_matches_full_run(self):
+        cache = ResultsCache(self.directory, store_columns=True)
+        cache.get(bets_pass_and_odds, quits_after_N_rounds, 30, {'N': 5},
+                  seed=3)
+        extended = cache.get(bets_pass_and_odds, quits_after_N_rounds, 50,
+                             {'N': 5}, seed=3, columns=True)
+        self.assertEqual(cache.extensions, 1)
+        full = simulate(bets_pass_and_odds, quits_after_N_rounds, {'N': 5},
+                        seed=3, stop=50)
+        self.assertEqual(extended['columns']['winnings'],
+                         full['winnings'].tolist())
+        aggregates = aggregate(full['winnings'])
+        self.assertAlmostEqual(extended['aggregates']['winnings']['mean'],
+                               aggregates['mean'])
+        self.assertAlmostEqual(extended['aggregates']['winnings']['m2'],
+                               aggregates['m2'])
+
+        ''' A smaller study is cut from the stored columns '''
+        smaller = cache.get(bets_pass_and_odds, quits_after_N_rounds, 10,
+                            {'N': 5}, seed=3, columns=True)
+        self.assertEqual(cache.hits, 1)
+        self.assertEqual(smaller['columns']['winnings'],
+                         full['winnings'].tolist()[:10])
+
+    def test_factory_strategies(self):
+        def make(mult):
+            def bets_pass_times(self, board_status):
+                if board_status.point == 0 and \
+                   not board_status.round_is_over:
+                    self.winnings = self.winnings - board_status.min_bet*mult
+                    return [Bet('pass', board_status.min_bet*mult)]
+                return []
+            return bets_pass_times
+        cache = ResultsCache(self.directory)
+        once = cache.get(make(1), quits_after_N_rounds, 50, {'N': 5})
+        tenfold = cache.get(make(10), quits_after_N_rounds, 50, {'N': 5})
+        self.assertEqual(cache.misses, 2)
+        self.assertAlmostEqual(tenfold['aggregates']['winnings']['mean'],
+                               10 * once['aggregates']['winnings']['mean'])
+        cache.get(make(10), quits_after_N_rounds, 50, {'N': 5})
+        self.assertEqual(cache.hits, 1)
+
+        ''' Captured values without a stable repr cannot be cached '''
+        with self.assertRaises(ValueError):
+            cache.get(make(object()), quits_after_N_rounds, 50, {'N': 5})
+
+    def test_mixed_column_caches(self):
+        ''' Caches with and without columns sharing one directory '''
+        without_columns = ResultsCache(self.directory)
+        with_columns = ResultsCache(self.directory, store_columns=True)
+        without_columns.get(bets_pass, quits_after_N_rounds, 30, {'N': 3})
+        extended = with_columns.get(bets_pass, quits_after_N_rounds, 50,
+                                    {'N': 3}, columns=True)
+        full = simulate(bets_pass, quits_after_N_rounds, {'N': 3}, stop=60)
+        self.assertEqual(extended['columns']['winnings'],
+                         full['winnings'].tolist()[:50])
+        smaller = with_columns.get(bets_pass, quits_after_N_rounds, 10,
+                                   {'N': 3}, columns=True)
+        self.assertEqual(smaller['columns']['winnings'],
+                         full['winnings'].tolist()[:10])
+
+        ''' Extending without columns leaves the column files short '''
+        without_columns.get(bets_pass, quits_after_N_rounds, 60, {'N': 3})
+        self.assertEqual(without_columns.extensions, 1)
+        extended = with_columns.get(bets_pass, quits_after_N_rounds, 60,
+                                    {'N': 3}, columns=True)
+        self.assertEqual(extended['columns']['winnings'],
+                         full['winnings'].tolist())
+        self.assertAlmostEqual(extended['aggregates']['winnings']['mean'],
+                               aggregate(full['winnings'])['mean'])
+        self.assertEqual(with_columns.get(bets_pass, quits_after_N_rounds,
+                                          40, {'N': 3}, columns=True)
+                         ['columns']['winnings'],
+                         full['winnings'].tolist()[:40])
+        self.assertEqual(with_columns.hits, 2)
+
+    def test_eviction(self):
+        cache = ResultsCache(self.directory, max_bytes=2000,
+                             store_columns=True)
+        for N in range(1, 6):
+            cache.get(bets_pass, quits_after_N_rounds, 20, {'N': N})
+        self.assertLessEqual(cache.size(), 2000)
+        cache.get(bets_pass, quits_after_N_rounds, 20, {'N': 5})
+        self.assertEqual(cache.hits, 1)
+        cache.get(bets_pass, quits_after_N_rounds, 20, {'N': 1})
+        self.assertEqual(cache.misses, 6)
+
+class TestTrace(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'session.trace')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_trace_matches_log(self):
+        player = Player(bets_pass_and_odds, quits_after_N_rounds)
+        player.N = 200
+        with Tracer(self.path, buffer_size=256) as tracer:
+            board = Board(tracer=tracer)
+            while not player.is_quitting():
+                board.reset()
+                while not board.get_status().round_is_over:
+                    board.take_bets(player.make_bets(board.get_status()))
+                    board.roll()
+                player.get_payouts(board.return_payouts())
+
+        trace = TraceReader(self.path, chunk_size=100)
+        self.assertEqual(trace.count(ROLL), player.log.num_rolls)
+        self.assertEqual(trace.count(BET), player.log.num_bets)
+        self.assertEqual(trace.count(PAYOUT, 'pass'), 200)
+        self.assertEqual(sum(trace.roll_histogram()), player.log.num_rolls)
+        bets = trace.totals(BET)
+        payouts = trace.totals(PAYOUT)
+        self.assertAlmostEqual(sum(payouts.values()) - sum(bets.values()),
+                               player.winnings)
+        self.assertEqual(trace.select(BET, 'pass')['amount'].sum(),
+                         5 * 200)
+        self.assertEqual(trace.select(PAYOUT)['round'][-1], 199)
+
+    def test_empty_trace(self):
+        Tracer(self.path).close()
+        trace = TraceReader(self.path)
+        self.assertEqual(len(trace), 0)
+        self.assertEqual(trace.totals(PAYOUT), {'pass': 0, 'pass_odds': 0})
+
+    def test_partial_record(self):
+        with Tracer(self.path) as tracer:
+            board = Board(tracer=tracer)
+            for roll in [4, 5, 6]:
+                board.roll(roll)
+        with open(self.path, 'ab') as trace:
+            trace.write(b'\x00' * 5)
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter('always')
+            trace = TraceReader(self.path)
+        self.assertEqual(len(caught), 1)
+        self.assertEqual(len(trace), 3)
+        self.assertEqual(list(trace.select(ROLL)['roll']), [4, 5, 6])
+
+    def test_unknown_bet_type(self):
+        tracer = Tracer(self.path)
+        Bet.__bets__['field'] = {'is_valid': pass_is_valid,
+                                 'get_payout': pass_get_payout}
+        try:
+            board = Board(tracer=tracer)
+            board.take_bets([Bet('pass', 5), Bet('field', 10)])
+            board.roll(7)
+            board.return_payouts()
+            tracer.close()
+        finally:
+            del Bet.__bets__['field']
+        trace = TraceReader(self.path)
+        self.assertEqual(trace.totals(BET),
+                         {'pass': 5, 'pass_odds': 0, UNKNOWN: 10})
+        self.assertEqual(trace.totals(PAYOUT)[UNKNOWN], 20)
+        self.assertEqual(trace.count(BET, UNKNOWN), 1)
+        with self.assertRaises(ValueError):
+            trace.count(BET, 'field')
+
+    def test_not_a_trace_exception(self):
+        with open(self.path, 'wb') as not_a_trace:
+            not_a_trace.write(b'not a trace at all')
+        with self.assertRaises(ValueError):
+            TraceReader(self.path)
+        with open(self.path, 'wb') as truncated:
+            truncated.write(b'CRAPSTRC\x02\x00')
+        with self.assertRaises(ValueError):
+            TraceReader(self.path)
+
+def dont_pass_get_payout(self, bet):
+    ''' Don't pass wins on 2 or 3, pushes on 12, and wins on a seven-out '''
+    if self.point == 0:
+        return {2: 2*bet.amount, 3: 2*bet.amount,
+                12: bet.amount}.get(self.last_roll, 0)
+    return 2*bet.amount if self.last_roll == 7 else 0
+
+class TestOddsTables(unittest.TestCase):
+
+    def test_pass(self):
+        table = odds_table('pass')
+        self.assertEqual(len(table), 1)
+        self.assertEqual(table[0]['p_win'], Fraction(244, 495))
+        self.assertEqual(table[0]['house_edge'], Fraction(7, 495))
+        self.assertEqual(house_edge('pass'), Fraction(7, 495))
+        self.assertIs(odds_table('pass'), table)
+
+    def test_pass_odds(self):
+        table = odds_table('pass_odds')
+        self.assertEqual(sorted(set(row['point'] for row in table)),
+                         [4, 5, 6, 8, 9, 10])
+        for row in table:
+            self.assertEqual(row['expected_value'], 0)
+        self.assertEqual(table[0]['p_win'], Fraction(1, 3))
+        with self.assertRaises(ValueError):
+            house_edge('pass_odds', 0)
+
+    def test_registered_bet(self):
+        Bet.__bets__['dont_pass'] = {'is_valid': pass_is_valid,
+                                     'get_payout': dont_pass_get_payout}
+        try:
+            self.assertIn('dont_pass', odds_tables())
+            row = odds_table('dont_pass')[0]
+            self.assertEqual(row['p_push'], Fraction(1, 36))
+            self.assertEqual(row['house_edge'], Fraction(3, 220))
+        finally:
+            del Bet.__bets__['dont_pass']
+
+    def test_round_distribution(self):
+        distribution = round_distribution(bets_pass)
+        self.assertEqual(sum(distribution.values()), 1)
+        self.assertEqual(distribution[5], Fraction(244, 495))
+        self.assertEqual(round_distribution(bets_nothing), {0: 1})
+
+        ''' Pass and odds: the odds change what a made point wins '''
+        distribution = round_distribution(bets_pass_and_odds)
+        self.assertEqual(sum(distribution.values()), 1)
+        self.assertEqual(distribution[5 + 10],
+                         2 * Fraction(3, 36) * Fraction(1, 3))
+        self.assertEqual(sum(winnings * p for winnings, p
+                             in distribution.items()), -Fraction(35, 495))
+
+    def test_unknown_bet_exception(self):
+        with self.assertRaises(NotImplementedError):
+            odds_table('hardways')
+
+class TestBands(unittest.TestCase):
+
+    def test_sketch_exact(self):
+        sketch = Sketch(16)
+        for value in [5, -5, 5, 10, 0]:
+            sketch.add(value)
+        self.assertEqual(sketch.quantile(0.5), 5)
+        self.assertEqual(sketch.quantile(0), -5)
+        self.assertEqual(sketch.quantile(1), 10)
+
+    def test_sketch_bounded(self):
+        sketch = Sketch(32)
+        for value in range(10000):
+            sketch.add(value)
+        self.assertEqual(len(sketch.values), 32)
+        self.assertEqual(sketch.total, 10000)
+        self.assertLess(abs(sketch.quantile(0.5) - 5000), 500)
+
+    def test_bands(self):
+        bands = BandAggregator(3)
+        bands.add([5, -5, 0])
+        bands.add([-5])
+        bands.add([5, 10, 15, 20])
+        self.assertEqual(bands.quantiles([0.5]), {0.5: [5, -5, 0]})
+        self.assertEqual(bands.means(), [5 / 3., 0, 10 / 3.])
+        self.assertEqual(bands.quantiles([1], 'drawdowns'),
+                         {1: [5, 10, 10]})
+
+    def test_bands_from_players(self):
+        bands = BandAggregator(30)
+        for ii in range(200):
+            player = Player(bets_pass, quits_after_gainG_or_lossL_or_roundMax)
+            player.gainG = 999999
+            player.lossL = 70
+            player.roundMax = 30
+            board = Board()
+            while not player.is_quitting():
+                board.reset()
+                while not board.get_status().round_is_over:
+                    board.take_bets(player.make_bets(board.get_status()))
+                    board.roll()
+                player.get_payouts(board.return_payouts())
+            bands.add_player(player)
+        quantiles = bands.quantiles()
+        self.assertEqual(bands.num_sessions, 200)
+        self.assertEqual(quantiles[0.05][0], -5)
+        self.assertEqual(quantiles[0.95][0], 5)
+        for low, high in zip(quantiles[0.05], quantiles[0.95]):
+            self.assertLessEqual(low, high)
+            self.assertGreaterEqual(low, -70)
+
+    def test_no_sessions_exception(self):
+        with self.assertRaises(ValueError):
+            BandAggregator(5).quantiles()
+
+class TestPopulation(unittest.TestCase):
+
+    def test_unsupported_strategy_exception(self):
+        def bets_everything(self, board_status):
+            return []
+        with self.assertRaises(NotImplementedError):
+            Population([bets_pass, bets_everything])
+
+    def test_min_bet_exception(self):
+        with self.assertRaises(ValueError):
+            Population([bets_pass, bets_pass], min_bets=[5, 0])
+        with self.assertRaises(ValueError):
+            Population([bets_pass, bets_pass], min_bets=5.5)
+
+    def test_infinite_round_max(self):
+        population = Population([bets_pass] * 3, lossL=20, roundMax=np.inf,
+                                seed=4)
+        population.run()
+        self.assertTrue(all(population.winnings <= -20))
+        self.assertTrue(any(population.num_rounds > 1))
+
+    def test_memory_per_player(self):
+        population = Population([bets_pass_and_odds] * 1000)
+        self.assertLessEqual(population.nbytes() / len(population), 64)
+
+    def test_fixed_rolls(self):
+        population = Population([bets_pass, bets_pass_and_odds, bets_nothing],
+                                roundMax=1)
+
+        ''' Roll 1, set the point '''
+        population.step([6, 6, 6])
+        self.assertEqual(list(population.winnings), [-5, -5, 0])
+        self.assertEqual(list(population.point), [6, 6, 6])
+
+        ''' Roll 2, hit another point; the odds taker bets 5 more '''
+        population.step([8, 8, 8])
+        self.assertEqual(list(population.winnings), [-5, -10, 0])
+
+        ''' Roll 3, hit the point; pass pays 1:1, odds pay 6:5 '''
+        population.step([6, 6, 6])
+        self.assertEqual(list(population.winnings), [5, 11, 0])
+        self.assertEqual(list(population.num_rolls), [3, 3, 3])
+        self.assertEqual(list(population.num_bets), [1, 2, 0])
+
+        ''' Everyone quits after the first round '''
+        self.assertEqual(population.step([7, 7, 7]), 0)
+        self.assertEqual(population.active_history, [3, 3, 3, 0])
+
+    def test_large_thresholds(self):
+        population = Population([bets_pass], gainG=2**24 + 1,
+                                lossL=float(2**24 + 1))
+        population.winnings[:] = 2**24
+        population.num_rounds[:] = 1
+        self.assertFalse(population.is_quitting()[0])
+        population.winnings[:] = -2**24
+        self.assertFalse(population.is_quitting()[0])
+        population.winnings[:] = 2**24 + 1
+        self.assertTrue(population.is_quitting()[0])
+
+    def test_hold_mid_round(self):
+        population = Population([bets_pass, bets_pass_and_odds])
+        population.step([7, 7])
+        population.step([4, 4])
+        population.step([6, 6])
+        self.assertEqual(list(population.winnings), [0, -5])
+        self.assertEqual(population.hold_percentage(), -100.)
+        summary = population.summary()['bets_pass_and_odds']
+        self.assertEqual(summary['hold_percentage'], -100.)
+        self.assertEqual(summary['mean_winnings'], 5.)
+
+    def test_pass_house_edge(self):
+        population = Population([bets_pass] * 100000, roundMax=1, seed=1)
+        population.run()
+        self.assertEqual(population.num_active(), 0)
+        self.assertTrue(all(population.num_rounds == 1))
+
+        '''
+        Expect the hold to be within 2 std dev of the pass house edge
+        Theoretical hold: 1.41%
+        Std dev: 100 * sqrt(1/N) = 0.32%
+        '''
+        self.assertLess(1.41 - 0.64, population.hold_percentage())
+        self.assertGreater(1.41 + 0.64, population.hold_percentage())
+
+class TestConformance(unittest.TestCase):
+
+    def test_population_matches_reference(self):
+        strategies = [bets_nothing, bets_pass, bets_pass_and_odds]
+        self.assertEqual(check_conformance(population_engine, strategies,
+                                           n_streams=50, seed=1), [])
+
+    def test_mismatch_detected(self):
+        def engine_missing_odds(betting_strategy, streams, **quit_params):
+            return population_engine(bets_pass, streams, **quit_params)
+        mismatches = check_conformance(engine_missing_odds,
+                                       [bets_pass_and_odds], n_streams=5)
+        self.assertTrue(mismatches)
+
+    def test_population_goodness_of_fit(self):
+        for betting_strategy in [bets_pass, bets_pass_and_odds]:
+            for min_bet in [5, 7]:
+                statistic, p_value = population_goodness_of_fit(
+                    betting_strategy, 20000, min_bet, seed=2)
+                self.assertLess(0.001, p_value)
+
+    def test_chi_square_sf(self):
+        self.assertAlmostEqual(chi_square_sf(3.841, 1), 0.05, places=3)
+        self.assertAlmostEqual(chi_square_sf(18.307, 10), 0.05, places=3)
+
 class TestOverallEdge(unittest.TestCase):
 
     def test_pass_house_edge(self):
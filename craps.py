@@ -1,16 +1,21 @@
 ''' Craps simulator module.
 
 This module allows for simulations of different craps betting strategies.
+
+All money -- bets, payouts and winnings -- is counted in whole units
+(e.g. dollars, or cents for finer bets), so results are exact.
 '''
 
-__free_odds__ = {4: {'num':2.,'den':1.},
-                 5: {'num':3.,'den':2.},
-                 6: {'num':6.,'den':5.},
-                 8: {'num':6.,'den':5.},
-                 9: {'num':3.,'den':2.},
-                 10:{'num':2.,'den':1.}}
+__free_odds__ = {4: {'num':2,'den':1},
+                 5: {'num':3,'den':2},
+                 6: {'num':6,'den':5},
+                 8: {'num':6,'den':5},
+                 9: {'num':3,'den':2},
+                 10:{'num':2,'den':1}}
 
 import random
+from collections.abc import Sequence
+from itertools import chain, islice
 
 
 def pass_is_valid(self, bet):
@@ -40,16 +45,23 @@ def pass_odds_get_payout(self, bet):
     ''' Pass odds pay out true odds
 
     By true odds, we mean 2:1 for 4 or 10, 3:2 for 5 or 9, and 6:5 for
-    6 or 8.
+    6 or 8.  Like a casino, winnings that are not a whole number of
+    units are rounded down; see odds_bet_amount() to avoid this.
     '''
     if not self.round_is_over:
         raise RuntimeError('''Don't pay out unless round is over!''')
     if self.point > 0 and self.last_roll == self.point:
-        return bet.amount * (1 + __free_odds__[self.point]['num']/
+        return bet.amount + (bet.amount * __free_odds__[self.point]['num'] //
                              __free_odds__[self.point]['den'])
     else:
         return 0
 
+def odds_bet_amount(min_bet, point):
+    ''' The smallest odds bet, at least min_bet, that true odds pay in
+    whole units '''
+    den = __free_odds__[point]['den']
+    return -(-min_bet // den) * den
+
 def bets_nothing(self, board_status):
     ''' Bet nothing '''
     return []
@@ -68,9 +80,8 @@ def bets_pass_and_odds(self, board_status):
         self.winnings = self.winnings - board_status.min_bet
         return [Bet('pass',board_status.min_bet)]
     elif board_status.point_just_set:
-        bet_amount = board_status.min_bet + \
-                     (board_status.min_bet % \
-                      __free_odds__[board_status.point]['den'])
+        bet_amount = odds_bet_amount(board_status.min_bet,
+                                     board_status.point)
         self.winnings = self.winnings - bet_amount
         return [Bet('pass_odds',bet_amount)]
     else:
@@ -101,6 +112,76 @@ def quits_after_gainG_or_lossL_or_roundMax(self):
            self.log.num_rounds >= self.roundMax)
 
 
+class WinningsHistory(Sequence):
+    ''' The WinningsHistory class is the winnings_history of a forked
+    Log.
+
+    It reads the first offset entries of the root log's list, and the
+    first length entries of an append-only list of later rounds.  Forks
+    share both lists, so forking copies nothing and never builds a
+    chain.  A history appends in place while it is at the end of the
+    shared list; once another fork has appended there first, it copies
+    its own entries since the root before appending.  Use list() for a
+    plain list.
+    '''
+    __slots__ = ['root', 'offset', 'entries', 'length']
+
+    def __init__(self, root):
+        self.root = root
+        self.offset = len(root)
+        self.entries = []
+        self.length = 0
+
+    def fork(self):
+        ''' A copy sharing this history's entries '''
+        history = WinningsHistory(self.root)
+        history.offset = self.offset
+        history.entries = self.entries
+        history.length = self.length
+        return history
+
+    def append(self, winnings):
+        if len(self.entries) != self.length:
+            self.entries = self.entries[:self.length]
+        self.entries.append(winnings)
+        self.length = self.length + 1
+
+    def copy(self):
+        return list(self)
+
+    def __len__(self):
+        return self.offset + self.length
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return list(self)[index]
+        if index < 0:
+            index = index + len(self)
+        if index < 0 or index >= len(self):
+            raise IndexError('Winnings history index out of range')
+        if index < self.offset:
+            return self.root[index]
+        return self.entries[index - self.offset]
+
+    def __iter__(self):
+        return chain(islice(self.root, self.offset),
+                     islice(self.entries, self.length))
+
+    def __add__(self, other):
+        return list(self) + list(other)
+
+    def __radd__(self, other):
+        return list(other) + list(self)
+
+    def __eq__(self, other):
+        if not isinstance(other, (Sequence, list)):
+            return NotImplemented
+        return len(self) == len(other) and list(self) == list(other)
+
+    def __repr__(self):
+        return repr(list(self))
+
+
 class Log:
     ''' The Log class provides data about the player '''
     def __init__(self):
@@ -109,6 +190,22 @@ class Log:
         self.num_bets = 0           # Maintained in Player.make_bets()
         self.winnings_history = []  # Maintained in Player.get_payouts()
 
+    def fork(self):
+        ''' Copy the log without copying its history.
+
+        The copy's winnings_history is a WinningsHistory sharing this
+        log's entries, which must only ever be appended to.
+        '''
+        log = Log()
+        log.num_rounds = self.num_rounds
+        log.num_rolls = self.num_rolls
+        log.num_bets = self.num_bets
+        if isinstance(self.winnings_history, WinningsHistory):
+            log.winnings_history = self.winnings_history.fork()
+        else:
+            log.winnings_history = WinningsHistory(self.winnings_history)
+        return log
+
     def __repr__(self):
         if self.winnings_history:
             return '<Log #rounds:%s #rolls:%s #bets:%s winnings:%s>' % \
@@ -131,8 +228,10 @@ class Bet:
     def __init__(self, bet_type, amount):
         if amount <= 0:
             raise ValueError('Bet amount must be positive')
+        if amount != int(amount):
+            raise ValueError('Bet amount must be a whole number of units')
         self.bet_type = bet_type
-        self.amount = amount
+        self.amount = int(amount)
 
     def __repr__(self):
         return '<Bet ' + self.bet_type + ' amount:%s>' % self.amount
@@ -159,10 +258,16 @@ class Board:
     # Use a point of 0 to denote an unset point
     __acceptable_points__ = [0, 4, 5, 6, 8, 9, 10]
     
-    def __init__(self, min_bet=5):
+    def __init__(self, min_bet=5, rng=None, tracer=None):
         if min_bet <= 0:
             raise ValueError('Min bet must be positive')
-        self.min_bet = min_bet
+        if min_bet != int(min_bet):
+            raise ValueError('Min bet must be a whole number of units')
+        self.min_bet = int(min_bet)
+        # Any object with a randint method, e.g. a random.Random instance
+        self.rng = rng if rng is not None else random
+        # Records each roll, bet and payout, e.g. a craps_trace.Tracer
+        self.tracer = tracer
         self.reset()
     
     def roll(self, fixed_roll=None):
@@ -175,8 +280,8 @@ class Board:
         if fixed_roll:
             self.last_roll = fixed_roll
         else:
-            dice1 = random.randint(1,6)
-            dice2 = random.randint(1,6)
+            dice1 = self.rng.randint(1,6)
+            dice2 = self.rng.randint(1,6)
             self.last_roll = dice1 + dice2
             
         # Set the point
@@ -191,6 +296,8 @@ class Board:
             self.round_is_over = self.last_roll in [2, 3, 7, 11, 12]
         elif not self.point_just_set:
             self.round_is_over = self.last_roll in [7, self.point]
+        if self.tracer is not None:
+            self.tracer.roll(self)
         return self.last_roll
 
     def take_bets(self, bets):
@@ -203,12 +310,16 @@ class Board:
             if not self.bet_validator(bet):
                 raise ValueError('Bet ' + str(bet) + ' not valid!')
             self.bets.append(bet)
+            if self.tracer is not None:
+                self.tracer.bet(self, bet)
 
     def return_payouts(self):
         ''' Return bets to the user, according to their get_payout functions '''
         payouts = []
         for bet in self.bets:
             payouts.append(Bet.__bets__[bet.bet_type]['get_payout'](self, bet))
+        if self.tracer is not None:
+            self.tracer.payouts(self, payouts)
         self.reset()
         return payouts
 
@@ -266,3 +377,92 @@ class Player:
         self.winnings = self.winnings + sum(payouts)
         self.log.winnings_history.append(self.winnings)
 
+
+
+class Snapshot:
+    ''' The Snapshot class freezes a mid-session Board and Player state '''
+    __slots__ = ['board_state', 'player_state', 'log']
+
+    def __init__(self, board, player):
+        self.board_state = (board.min_bet, board.round_is_over, board.point,
+                            board.point_just_set, board.last_roll,
+                            tuple(board.bets))
+        # Everything set on the player, e.g. quitting parameters such as N
+        self.player_state = tuple((key, value) for key, value in
+                                  vars(player).items() if key != 'log')
+        self.log = player.log.fork()
+
+    def __repr__(self):
+        return '<Snapshot point:%s bets:%s winnings:%s>' % \
+               (self.board_state[2], list(self.board_state[5]),
+                dict(self.player_state)['winnings'])
+
+    def fork(self, rng=None):
+        ''' Return a new (board, player) pair in the frozen state '''
+        min_bet, round_is_over, point, point_just_set, last_roll, bets = \
+                 self.board_state
+        board = Board(min_bet, rng)
+        board.round_is_over = round_is_over
+        board.point = point
+        board.point_just_set = point_just_set
+        board.last_roll = last_roll
+        board.bets = list(bets)
+        player = Player.__new__(Player)
+        for key, value in self.player_state:
+            setattr(player, key, value)
+        player.log = self.log.fork()
+        return board, player
+
+def play_session(board, player, betting_strategy=None):
+    ''' Play on from the current state until the player quits.
+
+    A round already in progress is finished before the player gets to
+    quit.  If betting_strategy is given, it replaces the player's own
+    strategy for their next bets only.  Returns the final winnings.
+    '''
+    in_round = board.bets or board.point > 0 or board.round_is_over
+    while in_round or not player.is_quitting():
+        if not in_round:
+            board.reset()
+        while not board.get_status().round_is_over:
+            if betting_strategy is not None:
+                own_strategy = player.betting_strategy
+                player.betting_strategy = betting_strategy
+                try:
+                    new_bets = player.make_bets(board.get_status())
+                finally:
+                    player.betting_strategy = own_strategy
+                betting_strategy = None
+            else:
+                new_bets = player.make_bets(board.get_status())
+            board.take_bets(new_bets)
+            board.roll()
+        player.get_payouts(board.return_payouts())
+        in_round = False
+    return player.winnings
+
+def rollouts(snapshot, n, betting_strategy=None, seed=None):
+    ''' Play n sessions from the snapshot and return their final winnings.
+
+    If seed is given, rollout ii always sees the same dice, so rollouts
+    of different decisions from the same snapshot can be compared one to
+    one.
+    '''
+    winnings = []
+    for ii in range(n):
+        rng = random.Random('%s:%s' % (seed, ii)) if seed is not None \
+              else None
+        board, player = snapshot.fork(rng)
+        winnings.append(play_session(board, player, betting_strategy))
+    return winnings
+
+def evaluate_decisions(snapshot, decisions, n, seed=0):
+    ''' Compare alternative next bets from the snapshot.
+
+    decisions maps a name to the betting strategy used for the player's
+    next bets, e.g. {'odds': bets_pass_and_odds, 'no odds': bets_pass}.
+    Every decision is rolled out n times on the same dice.  Returns a
+    dict mapping each name to its list of final winnings.
+    '''
+    return {name: rollouts(snapshot, n, betting_strategy, seed)
+            for name, betting_strategy in decisions.items()}
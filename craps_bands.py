@@ -0,0 +1,153 @@
+''' Craps bands module.
+
+This module summarizes how Player.winnings evolves round by round across
+many sessions, without keeping every session's winnings_history.  Each
+session is folded into per-round quantile sketches of the winnings and
+of the running max drawdown (the largest drop from the best winnings so
+far), then discarded.  Memory is O(rounds x sketch size) however many
+sessions are added.
+
+Sessions that quit early keep their final winnings for the remaining
+rounds, so every round's bands cover every session.
+'''
+
+from bisect import bisect_left
+
+
+class Sketch:
+    ''' The Sketch class is a streaming histogram of at most max_bins
+    bins.
+
+    While there are no more distinct values than bins, it is exact.
+    After that, the two closest bins are merged into their weighted
+    mean whenever a new bin would go over the limit.
+    '''
+    def __init__(self, max_bins=256):
+        if max_bins < 2:
+            raise ValueError('A sketch needs at least 2 bins')
+        self.max_bins = max_bins
+        self.values = []
+        self.counts = []
+        self.total = 0
+
+    def __repr__(self):
+        return '<Sketch #bins:%s total:%s>' % (len(self.values), self.total)
+
+    def add(self, value, count=1):
+        ''' Add count copies of value '''
+        self.total = self.total + count
+        ii = bisect_left(self.values, value)
+        if ii < len(self.values) and self.values[ii] == value:
+            self.counts[ii] = self.counts[ii] + count
+            return
+        self.values.insert(ii, value)
+        self.counts.insert(ii, count)
+        if len(self.values) > self.max_bins:
+            gaps = [self.values[jj + 1] - self.values[jj]
+                    for jj in range(len(self.values) - 1)]
+            jj = gaps.index(min(gaps))
+            count = self.counts[jj] + self.counts[jj + 1]
+            self.values[jj] = (self.values[jj] * self.counts[jj] +
+                               self.values[jj + 1] * self.counts[jj + 1]) / \
+                              float(count)
+            self.counts[jj] = count
+            del self.values[jj + 1]
+            del self.counts[jj + 1]
+
+    def quantile(self, q):
+        ''' The smallest value with at least a fraction q of the total at
+        or below it '''
+        if not self.total:
+            raise ValueError('Empty sketch has no quantiles')
+        target = q * self.total
+        cumulative = 0
+        for value, count in zip(self.values, self.counts):
+            cumulative = cumulative + count
+            if cumulative >= target:
+                return value
+        return self.values[-1]
+
+
+class BandAggregator:
+    ''' The BandAggregator class builds per-round bands across sessions '''
+    def __init__(self, num_rounds, sketch_size=256):
+        if num_rounds <= 0:
+            raise ValueError('Number of rounds must be positive')
+        self.num_rounds = num_rounds
+        self.num_sessions = 0
+        self.winnings = [Sketch(sketch_size) for ii in range(num_rounds)]
+        self.drawdowns = [Sketch(sketch_size) for ii in range(num_rounds)]
+        self.winnings_sums = [0] * num_rounds
+        self.drawdown_sums = [0] * num_rounds
+
+    def __repr__(self):
+        return '<BandAggregator #rounds:%s #sessions:%s>' % \
+               (self.num_rounds, self.num_sessions)
+
+    def add(self, winnings_history):
+        ''' Fold in one session's winnings after each round.
+
+        Rounds past num_rounds are ignored.
+        '''
+        winnings = 0
+        peak = 0
+        drawdown = 0
+        history = iter(winnings_history)
+        for ii in range(self.num_rounds):
+            winnings = next(history, winnings)
+            peak = max(peak, winnings)
+            drawdown = max(drawdown, peak - winnings)
+            self.winnings[ii].add(winnings)
+            self.drawdowns[ii].add(drawdown)
+            self.winnings_sums[ii] = self.winnings_sums[ii] + winnings
+            self.drawdown_sums[ii] = self.drawdown_sums[ii] + drawdown
+        self.num_sessions = self.num_sessions + 1
+
+    def add_player(self, player):
+        ''' Fold in a player's session '''
+        self.add(player.log.winnings_history)
+
+    def rounds(self):
+        ''' Round numbers, for the x axis of plots '''
+        return list(range(1, self.num_rounds + 1))
+
+    def quantiles(self, quantiles=(0.05, 0.5, 0.95), of='winnings'):
+        ''' Per-round quantiles of the winnings or drawdowns.
+
+        Returns a dict mapping each quantile to a list with one value
+        per round.
+        '''
+        sketches = self.sketches(of)
+        return {q: [sketch.quantile(q) for sketch in sketches]
+                for q in quantiles}
+
+    def means(self, of='winnings'):
+        ''' Per-round means of the winnings or drawdowns '''
+        self.sketches(of)
+        sums = self.winnings_sums if of == 'winnings' else self.drawdown_sums
+        return [total / float(self.num_sessions) for total in sums]
+
+    def sketches(self, of):
+        if of not in ['winnings', 'drawdowns']:
+            raise ValueError('Bands are of winnings or drawdowns, not ' + of)
+        if not self.num_sessions:
+            raise ValueError('No sessions added yet')
+        return self.winnings if of == 'winnings' else self.drawdowns
+
+    def fan_chart(self, bands=((0.05, 0.95), (0.25, 0.75)), of='winnings',
+                  color='purple', label=None, ax=None):
+        ''' Plot the median and shaded quantile bands with matplotlib '''
+        import matplotlib.pyplot as plt
+        if ax is None:
+            ax = plt.gca()
+        quantiles = self.quantiles([q for band in bands for q in band] +
+                                   [0.5], of)
+        rounds = self.rounds()
+        for ii, (low, high) in enumerate(bands):
+            ax.fill_between(rounds, quantiles[low], quantiles[high],
+                            color=color, alpha=0.2 + 0.2 * ii, linewidth=0)
+        ax.plot(rounds, quantiles[0.5], color=color, label=label)
+        ax.set_xlabel('Round')
+        ax.set_ylabel('Winnings (profit in $)' if of == 'winnings' else
+                      'Max drawdown (in $)')
+        return ax
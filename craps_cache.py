@@ -0,0 +1,322 @@
+''' Craps results cache module.
+
+This module runs studies -- N sessions of one betting and quitting
+strategy -- and caches their results on disk.  Results are keyed by a
+hash of everything that determines them: the strategy functions' source,
+defaults and captured values (and those of the module-level functions
+they use), the source of craps.py, the quitting parameters, the min bet and the
+seed.  The number of sessions is not part of the key; session ii always
+rolls the same dice for a given seed, so a cached study of N sessions
+can be extended to more sessions without rerunning the first N.
+'''
+
+import hashlib
+import inspect
+import json
+import os
+import random
+import types
+from array import array
+
+import craps
+from craps import Board, Player
+
+# Per-session columns, with their array typecodes
+__columns__ = {'winnings': 'q',
+               'num_rounds': 'q',
+               'num_rolls': 'q',
+               'num_bets': 'q'}
+
+
+def code_identity(code):
+    ''' Bytecode and constants of a code object and the code nested in it '''
+    return repr(code.co_code) + ''.join(
+        code_identity(const) if isinstance(const, types.CodeType) else
+        repr(const) for const in code.co_consts)
+
+def global_names(code):
+    ''' Names of the globals a code object and the code nested in it use '''
+    names = set(code.co_names)
+    for const in code.co_consts:
+        if isinstance(const, types.CodeType):
+            names |= global_names(const)
+    return names
+
+def stable_repr(value, seen):
+    ''' A repr of value that is the same from one run to the next.
+
+    Functions are replaced by their identity.  Raises ValueError for
+    values whose repr holds a memory address.
+    '''
+    if isinstance(value, types.FunctionType):
+        return function_identity(value, seen) if value not in seen else \
+               '%s.%s' % (value.__module__, value.__qualname__)
+    if isinstance(value, (list, tuple)):
+        return '%s(%s)' % (type(value).__name__,
+                           ', '.join(stable_repr(item, seen)
+                                     for item in value))
+    if isinstance(value, (set, frozenset)):
+        return '%s(%s)' % (type(value).__name__,
+                           ', '.join(sorted(stable_repr(item, seen)
+                                            for item in value)))
+    if isinstance(value, dict):
+        return '{%s}' % ', '.join(sorted(
+            '%s: %s' % (stable_repr(key, seen), stable_repr(item, seen))
+            for key, item in value.items()))
+    representation = repr(value)
+    if ' at 0x' in representation:
+        raise ValueError('Cannot cache a study using %s, which has no '
+                         'stable repr' % representation)
+    return representation
+
+def function_identity(fn, seen=None):
+    ''' Name, source, defaults and captured values of a function, and the
+    identities of the module-level functions and values it uses.
+
+    Raises ValueError if any of these has no stable repr.
+    '''
+    seen = set() if seen is None else seen
+    seen.add(fn)
+    try:
+        source = inspect.getsource(fn)
+    except (OSError, TypeError):
+        source = code_identity(fn.__code__)
+    cells = []
+    for cell in fn.__closure__ or ():
+        try:
+            cells.append(cell.cell_contents)
+        except ValueError:
+            # A cell that is not filled in yet
+            cells.append(None)
+    parts = ['%s.%s' % (fn.__module__, fn.__qualname__), source,
+             stable_repr(fn.__defaults__, seen),
+             stable_repr(fn.__kwdefaults__, seen),
+             stable_repr(cells, seen)]
+    for name in sorted(global_names(fn.__code__)):
+        value = fn.__globals__.get(name)
+        if isinstance(value, types.FunctionType):
+            if value not in seen:
+                parts.append(name + ' = ' + function_identity(value, seen))
+        elif isinstance(value, (bool, int, float, str, bytes, list, tuple,
+                                set, frozenset, dict)):
+            parts.append(name + ' = ' + stable_repr(value, seen))
+    return '\n'.join(parts)
+
+def source_version():
+    ''' Hash of the craps.py source '''
+    with open(craps.__file__, 'rb') as source:
+        return hashlib.sha256(source.read()).hexdigest()
+
+def study_key(betting_strategy, quitting_strategy, params=None, min_bet=5,
+              seed=0):
+    ''' Hash identifying a study, regardless of its number of sessions '''
+    identity = json.dumps([function_identity(betting_strategy),
+                           function_identity(quitting_strategy),
+                           source_version(),
+                           sorted((params or {}).items()),
+                           min_bet, seed])
+    return hashlib.sha256(identity.encode()).hexdigest()
+
+def simulate(betting_strategy, quitting_strategy, params=None, min_bet=5,
+             seed=0, start=0, stop=1):
+    ''' Play sessions start to stop - 1 and return their columns.
+
+    params are set as attributes on each player, e.g. {'N': 30} for
+    quits_after_N_rounds.  Session ii rolls its own seeded dice.
+    '''
+    columns = {column: array(typecode)
+               for column, typecode in __columns__.items()}
+    for ii in range(start, stop):
+        player = Player(betting_strategy, quitting_strategy)
+        for attribute, value in (params or {}).items():
+            setattr(player, attribute, value)
+        board = Board(min_bet, random.Random('%s:%s' % (seed, ii)))
+        while not player.is_quitting():
+            board.reset()
+            while not board.get_status().round_is_over:
+                board.take_bets(player.make_bets(board.get_status()))
+                board.roll()
+            player.get_payouts(board.return_payouts())
+        columns['winnings'].append(player.winnings)
+        columns['num_rounds'].append(player.log.num_rounds)
+        columns['num_rolls'].append(player.log.num_rolls)
+        columns['num_bets'].append(player.log.num_bets)
+    return columns
+
+def aggregate(values):
+    ''' Count, mean, sum of squared deviations, min and max of values '''
+    n = len(values)
+    if n == 0:
+        return {'n': 0, 'mean': 0., 'm2': 0., 'min': None, 'max': None}
+    mean = sum(values) / float(n)
+    return {'n': n, 'mean': mean,
+            'm2': sum((value - mean) ** 2 for value in values),
+            'min': min(values), 'max': max(values)}
+
+def merge_aggregates(first, second):
+    ''' Combine the aggregates of two disjoint sets of sessions '''
+    if first['n'] == 0:
+        return dict(second)
+    if second['n'] == 0:
+        return dict(first)
+    n = first['n'] + second['n']
+    delta = second['mean'] - first['mean']
+    return {'n': n,
+            'mean': first['mean'] + delta * second['n'] / n,
+            'm2': first['m2'] + second['m2'] +
+                  delta ** 2 * first['n'] * second['n'] / n,
+            'min': min(first['min'], second['min']),
+            'max': max(first['max'], second['max'])}
+
+
+class ResultsCache:
+    ''' The ResultsCache class serves studies from a directory on disk '''
+    def __init__(self, directory, max_bytes=100 * 2**20,
+                 store_columns=False):
+        if max_bytes <= 0:
+            raise ValueError('Cache size must be positive')
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.store_columns = store_columns
+        self.hits = 0
+        self.extensions = 0
+        self.misses = 0
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+    def __repr__(self):
+        return '<ResultsCache %s hits:%s extensions:%s misses:%s>' % \
+               (self.directory, self.hits, self.extensions, self.misses)
+
+    def path(self, key, extension):
+        return os.path.join(self.directory, key + '.' + extension)
+
+    def get(self, betting_strategy, quitting_strategy, n, params=None,
+            min_bet=5, seed=0, columns=False):
+        ''' Return the results of a study of n sessions.
+
+        The result is a dict with the number of sessions 'n', and
+        'aggregates' mapping each column to its count, mean, m2 (sum of
+        squared deviations), min and max.  If columns is True, it also
+        has 'columns' mapping each column to its per-session values;
+        this needs a cache that stores columns.
+        '''
+        if columns and not self.store_columns:
+            raise ValueError('Cache does not store per-session columns')
+        key = study_key(betting_strategy, quitting_strategy, params,
+                        min_bet, seed)
+        entry = self.load(key)
+        # Number of sessions in the column files, which can be fewer than
+        # the entry's if it was stored by a cache without columns
+        columns_n = entry.get('columns_n', 0) if entry is not None else 0
+        if entry is not None and entry['n'] == n and \
+           (columns_n >= n or not columns):
+            self.hits = self.hits + 1
+        elif entry is not None and entry['n'] > n and columns_n >= n:
+            self.hits = self.hits + 1
+            stored = self.load_columns(key, n)
+            entry = {'n': n, 'aggregates': {
+                column: aggregate(stored[column]) for column in __columns__}}
+        elif entry is not None and entry['n'] < n and \
+             (columns_n == entry['n'] or not self.store_columns):
+            self.extensions = self.extensions + 1
+            new_columns = simulate(betting_strategy, quitting_strategy,
+                                   params, min_bet, seed, entry['n'], n)
+            start = entry['n']
+            entry = {'n': n, 'aggregates': {
+                column: merge_aggregates(entry['aggregates'][column],
+                                         aggregate(new_columns[column]))
+                for column in __columns__}}
+            if self.store_columns:
+                self.store(key, dict(entry, columns_n=n), new_columns, start)
+            else:
+                self.store(key, dict(entry, columns_n=columns_n))
+        else:
+            # Run the study in full.  A larger study is kept cached, but
+            # its column files are rebuilt if they are too short.
+            self.misses = self.misses + 1
+            new_columns = simulate(betting_strategy, quitting_strategy,
+                                   params, min_bet, seed, 0, n)
+            larger = entry if entry is not None and entry['n'] > n else None
+            entry = {'n': n, 'aggregates': {
+                column: aggregate(new_columns[column])
+                for column in __columns__}}
+            stored = larger or entry
+            if self.store_columns:
+                self.store(key, dict(stored, columns_n=n), new_columns, 0)
+            elif larger is None:
+                self.store(key, dict(entry, columns_n=0))
+        self.touch(key)
+        entry = {'n': n, 'aggregates': entry['aggregates']}
+        if columns:
+            entry['columns'] = {column: values.tolist() for column, values
+                                in self.load_columns(key, n).items()}
+        return entry
+
+    def load(self, key):
+        ''' Load a cached entry, or None '''
+        try:
+            with open(self.path(key, 'json')) as cached:
+                return json.load(cached)
+        except (IOError, ValueError):
+            return None
+
+    def load_columns(self, key, n):
+        ''' Load the first n values of each cached column '''
+        stored = {}
+        for column, typecode in __columns__.items():
+            values = array(typecode)
+            with open(self.path(key, column), 'rb') as cached:
+                values.fromfile(cached, n)
+            stored[column] = values
+        return stored
+
+    def store(self, key, entry, new_columns=None, start=0):
+        ''' Save an entry, writing new_columns as sessions start onwards.
+
+        The column files are cut to start sessions first, so sessions
+        from an interrupted store never stay behind.  entry['columns_n']
+        must give the number of sessions in the column files.
+        '''
+        if new_columns is not None:
+            for column, values in new_columns.items():
+                with open(self.path(key, column),
+                          'r+b' if start else 'wb') as cached:
+                    cached.seek(start * values.itemsize)
+                    cached.truncate()
+                    values.tofile(cached)
+        temporary = self.path(key, 'json.tmp')
+        with open(temporary, 'w') as cached:
+            json.dump(entry, cached)
+        os.replace(temporary, self.path(key, 'json'))
+        self.evict(keep=key)
+
+    def touch(self, key):
+        ''' Mark an entry as recently used '''
+        os.utime(self.path(key, 'json'), None)
+
+    def size(self):
+        ''' Total bytes used by the cache '''
+        return sum(os.path.getsize(os.path.join(self.directory, name))
+                   for name in os.listdir(self.directory))
+
+    def evict(self, keep=None):
+        ''' Drop least recently used entries until the cache fits '''
+        entries = {}
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            key = name.split('.')[0]
+            size, last_used = entries.get(key, (0, 0))
+            if name == key + '.json':
+                last_used = os.path.getmtime(path)
+            entries[key] = (size + os.path.getsize(path), last_used)
+        total = sum(size for size, last_used in entries.values())
+        for key in sorted(entries, key=lambda key: entries[key][1]):
+            if total <= self.max_bytes:
+                break
+            if key == keep:
+                continue
+            for name in os.listdir(self.directory):
+                if name.split('.')[0] == key:
+                    os.remove(os.path.join(self.directory, name))
+            total = total - entries[key][0]
@@ -0,0 +1,215 @@
+''' Craps conformance module.
+
+This module checks that a fast engine plays craps exactly like the
+reference Board and Player classes.  Both are run on the same replayed
+dice streams and compared roll by roll; engines that cannot replay dice
+are instead compared against the exact single-round distribution from
+craps_odds.round_distribution with a chi-square goodness-of-fit test.
+
+An engine is a function engine(betting_strategy, streams, **quit_params)
+returning one trace per dice stream.  A trace is a list with one record
+per roll:
+    (winnings, point, point_just_set, num_rounds, num_rolls, num_bets,
+     payout)
+taken after the roll and after any payouts are collected.  payout is the
+total paid back to the player on that roll.
+'''
+
+import math
+import random
+
+import numpy as np
+
+from craps import Board, Player, quits_after_gainG_or_lossL_or_roundMax
+from craps_odds import round_distribution
+from craps_population import Population
+
+# Dice streams that exercise the edge cases: naturals, craps, a point hit
+# on the roll right after it is set (point_just_set), points hit after
+# other rolls, and seven-outs, on every point
+__edge_case_streams__ = [[7, 11, 2, 3, 12]] + \
+    [[point, point, point, 7] for point in [4, 5, 6, 8, 9, 10]] + \
+    [[point, 2, 3, 11, 12, 4 if point != 4 else 10, point]
+     for point in [4, 5, 6, 8, 9, 10]] + \
+    [[point, 7, point, 6 if point != 6 else 8, 7]
+     for point in [4, 5, 6, 8, 9, 10]]
+
+
+def reference_trace(betting_strategy, stream, min_bet=5, gainG=float('inf'),
+                    lossL=float('inf'), roundMax=10):
+    ''' Play the reference classes on a dice stream until the player quits '''
+    player = Player(betting_strategy, quits_after_gainG_or_lossL_or_roundMax)
+    player.gainG = gainG
+    player.lossL = lossL
+    player.roundMax = roundMax
+    board = Board(min_bet)
+    rolls = iter(stream)
+    trace = []
+    while not player.is_quitting():
+        board.reset()
+        while not board.get_status().round_is_over:
+            board.take_bets(player.make_bets(board.get_status()))
+            board.roll(next(rolls))
+            if not board.round_is_over:
+                trace.append((player.winnings, board.point,
+                              board.point_just_set, player.log.num_rounds,
+                              player.log.num_rolls, player.log.num_bets, 0))
+        payouts = board.return_payouts()
+        player.get_payouts(payouts)
+        trace.append((player.winnings, board.point, board.point_just_set,
+                      player.log.num_rounds, player.log.num_rolls,
+                      player.log.num_bets, sum(payouts)))
+    return trace
+
+def reference_engine(betting_strategy, streams, **quit_params):
+    ''' Engine running the reference classes, one stream at a time '''
+    return [reference_trace(betting_strategy, stream, **quit_params)
+            for stream in streams]
+
+def population_engine(betting_strategy, streams, min_bet=5,
+                      gainG=float('inf'), lossL=float('inf'), roundMax=10):
+    ''' Engine running a Population with one player per stream '''
+    population = Population([betting_strategy] * len(streams), min_bet,
+                            gainG, lossL, roundMax)
+    lengths = [len(stream) for stream in streams]
+    padded = np.zeros((len(streams), max(lengths) + 1), dtype=np.int8)
+    for ii, stream in enumerate(streams):
+        padded[ii, :lengths[ii]] = stream
+    traces = [[] for stream in streams]
+    players = np.arange(len(streams))
+    while True:
+        winnings = population.winnings.copy()
+        wagered = population.wagered.copy()
+        rolls = padded[players, np.minimum(population.num_rolls,
+                                           padded.shape[1] - 1)]
+        if not population.step(rolls):
+            break
+        payouts = population.winnings - winnings + \
+                  population.wagered - wagered
+        for ii in np.flatnonzero(population.active):
+            if population.num_rolls[ii] > lengths[ii]:
+                raise IndexError('Dice stream %s ran out' % ii)
+            traces[ii].append((population.winnings[ii],
+                               population.point[ii],
+                               population.point_just_set[ii],
+                               population.num_rounds[ii],
+                               population.num_rolls[ii],
+                               population.num_bets[ii],
+                               payouts[ii]))
+    return traces
+
+def random_streams(n_streams, length, seed=None):
+    ''' Random dice streams, each of the given length '''
+    rng = random.Random(seed)
+    return [[rng.randint(1, 6) + rng.randint(1, 6) for ii in range(length)]
+            for jj in range(n_streams)]
+
+def check_conformance(engine, betting_strategies, n_streams=200, seed=None,
+                      quit_params=None):
+    ''' Compare an engine with the reference classes on replayed dice.
+
+    Every betting strategy is run on the edge case streams (followed by
+    naturals) and on random streams, under each set of quit parameters.
+    Money is in whole units, so records must match exactly.  Returns a
+    list of mismatches, as (strategy name, quit params, stream, roll
+    number, reference record, engine record); an empty list means the
+    engine conforms.
+    '''
+    if quit_params is None:
+        quit_params = [{'roundMax': 1},
+                       {'roundMax': 10},
+                       {'gainG': 20, 'lossL': 20, 'roundMax': 50},
+                       {'min_bet': 7, 'lossL': 30, 'roundMax': 20},
+                       {'min_bet': 2**24, 'gainG': 2**24 + 1,
+                        'lossL': 2**25 + 1, 'roundMax': 20}]
+    mismatches = []
+    for params in quit_params:
+        for betting_strategy in betting_strategies:
+            streams = [stream + [7] * 100
+                       for stream in __edge_case_streams__] + \
+                      random_streams(n_streams, 2000, seed)
+            expected = reference_engine(betting_strategy, streams, **params)
+            actual = engine(betting_strategy, streams, **params)
+            for stream, ref, fast in zip(streams, expected, actual):
+                for ii in range(max(len(ref), len(fast))):
+                    ref_record = tuple(ref[ii]) if ii < len(ref) else None
+                    fast_record = tuple(fast[ii]) if ii < len(fast) else None
+                    if ref_record != fast_record:
+                        mismatches.append((betting_strategy.__name__, params,
+                                           stream, ii, ref_record,
+                                           fast_record))
+                        break
+    return mismatches
+
+def chi_square_sf(statistic, dof):
+    ''' Survival function of the chi-square distribution.
+
+    Computed as the regularized upper incomplete gamma function Q(a, x)
+    with a = dof/2 and x = statistic/2.
+    '''
+    a = dof / 2.
+    x = statistic / 2.
+    if x <= 0:
+        return 1.
+    log_prefactor = -x + a * math.log(x) - math.lgamma(a)
+    if x < a + 1:
+        # Series for the lower incomplete gamma function
+        term = total = 1. / a
+        n = a
+        while abs(term) > abs(total) * 1e-15:
+            n = n + 1
+            term = term * x / n
+            total = total + term
+        return 1. - total * math.exp(log_prefactor)
+    # Continued fraction for the upper incomplete gamma function
+    tiny = 1e-300
+    b = x + 1. - a
+    c = 1. / tiny
+    d = 1. / b
+    h = d
+    for ii in range(1, 1000):
+        an = -ii * (ii - a)
+        b = b + 2.
+        d = an * d + b
+        d = tiny if abs(d) < tiny else d
+        c = b + an / c
+        c = tiny if abs(c) < tiny else c
+        d = 1. / d
+        delta = d * c
+        h = h * delta
+        if abs(delta - 1.) < 1e-15:
+            break
+    return math.exp(log_prefactor) * h
+
+def goodness_of_fit(samples, distribution):
+    ''' Chi-square test of samples against an exact distribution.
+
+    Returns (statistic, p value).  Samples outside the distribution's
+    support give a p value of 0.
+    '''
+    counts = {}
+    for sample in samples:
+        counts[sample] = counts.get(sample, 0) + 1
+    if set(counts) - set(distribution):
+        return float('inf'), 0.
+    n = len(samples)
+    statistic = sum((counts.get(value, 0) - n * p) ** 2 / (n * p)
+                    for value, p in distribution.items())
+    statistic = float(statistic)
+    return statistic, chi_square_sf(statistic, len(distribution) - 1)
+
+def population_single_rounds(betting_strategy, n, min_bet=5, seed=None):
+    ''' Winnings of n single-round players in a randomly rolled Population '''
+    population = Population([betting_strategy] * n, min_bet, roundMax=1,
+                            seed=seed)
+    return population.run().winnings.tolist()
+
+def population_goodness_of_fit(betting_strategy, n, min_bet=5, seed=None):
+    ''' Chi-square test of n single-round players in a randomly rolled
+    Population against the exact single-round distribution.
+
+    Returns (statistic, p value).
+    '''
+    return goodness_of_fit(
+        population_single_rounds(betting_strategy, n, min_bet, seed),
+        round_distribution(betting_strategy, min_bet))
@@ -0,0 +1,220 @@
+''' Craps odds module.
+
+This module computes exact odds for every bet in Bet.__bets__.  It
+enumerates the board states a bet can be placed in, and follows every
+dice outcome through Board.roll and the bet's registered is_valid and
+get_payout functions, solving the resulting Markov chain with exact
+fractions.  Nothing about a bet is hard-coded here, so any bet added to
+the registry gets its tables automatically.  The same machinery gives
+the exact distribution of a betting strategy's winnings over one round.
+
+A table has one row per (point, point_just_set) state in which the bet
+is valid.  Amounts are given per unit wagered.
+'''
+
+from fractions import Fraction
+
+from craps import Bet, Board, Player
+
+# Number of ways to roll each total with two dice
+__ways__ = {total: 6 - abs(total - 7) for total in range(2, 13)}
+
+# Payouts of registered bets that return floats rather than whole units
+# are snapped to the nearest fraction with at most this denominator
+__max_denominator__ = 10**6
+
+# Cache of computed tables, keyed by the bet's registry entry and amount
+__tables__ = {}
+
+
+def board_in_state(state, min_bet=5):
+    ''' A Board in the given (point, point_just_set, round_is_over,
+    last_roll) state '''
+    board = Board(min_bet)
+    board.point, board.point_just_set, board.round_is_over, \
+        board.last_roll = state
+    return board
+
+def board_state(board):
+    return (board.point, board.point_just_set, board.round_is_over,
+            board.last_roll)
+
+def next_states(state):
+    ''' The (probability, state) pairs after one roll from state '''
+    transitions = []
+    for roll, ways in __ways__.items():
+        board = board_in_state(state)
+        board.roll(roll)
+        transitions.append((Fraction(ways, 36), board_state(board)))
+    return transitions
+
+def betting_states():
+    ''' Every state reachable from a reset board before a roll '''
+    start = board_state(Board())
+    states = [start]
+    seen = set(states)
+    for state in states:
+        for probability, following in next_states(state):
+            if not following[2] and following not in seen:
+                seen.add(following)
+                states.append(following)
+    return states
+
+def exact(amount):
+    ''' An amount as a Fraction; registered bets that return floats are
+    snapped to the nearest fraction with a small denominator '''
+    return Fraction(amount).limit_denominator(__max_denominator__)
+
+def absorption_distribution(start, moves):
+    ''' Exact distribution of how a Markov chain ends.
+
+    moves(state) returns the (probability, following, outcome) moves out
+    of a transient state: following is the next transient state, or None
+    when the move ends the chain with the given outcome.  Returns a dict
+    mapping each outcome to its probability, from start.
+    '''
+    # Collect the transient states, and where each move leads
+    transient = [start]
+    index = {start: 0}
+    rows = []
+    for current in transient:
+        row = []
+        for probability, following, outcome in moves(current):
+            if following is not None:
+                if following not in index:
+                    index[following] = len(transient)
+                    transient.append(following)
+                following = index[following]
+            row.append((probability, following, outcome))
+        rows.append(row)
+
+    # Solve (I - Q) X = R, where Q moves between transient states and R
+    # ends the chain with an outcome
+    outcomes = sorted(set(outcome for row in rows
+                          for probability, following, outcome in row
+                          if following is None))
+    column = {outcome: ii for ii, outcome in enumerate(outcomes)}
+    n = len(transient)
+    matrix = []
+    for ii, moves_out in enumerate(rows):
+        row = [Fraction(0)] * (n + len(outcomes))
+        row[ii] = Fraction(1)
+        for probability, following, outcome in moves_out:
+            if following is None:
+                row[n + column[outcome]] += probability
+            else:
+                row[following] -= probability
+        matrix.append(row)
+    for ii in range(n):
+        pivot = next(jj for jj in range(ii, n) if matrix[jj][ii] != 0)
+        matrix[ii], matrix[pivot] = matrix[pivot], matrix[ii]
+        scale = matrix[ii][ii]
+        matrix[ii] = [value / scale for value in matrix[ii]]
+        for jj in range(n):
+            if jj != ii and matrix[jj][ii] != 0:
+                factor = matrix[jj][ii]
+                matrix[jj] = [value - factor * pivot_value for value,
+                              pivot_value in zip(matrix[jj], matrix[ii])]
+    return {outcome: matrix[0][n + column[outcome]] for outcome in outcomes
+            if matrix[0][n + column[outcome]] != 0}
+
+def payout_distribution(state, bet):
+    ''' Exact distribution of a bet's payout, placed in state.
+
+    Returns a dict mapping each payout to its probability.
+    '''
+    get_payout = Bet.__bets__[bet.bet_type]['get_payout']
+
+    def moves(current):
+        for probability, following in next_states(current):
+            if following[2]:
+                yield (probability, None,
+                       exact(get_payout(board_in_state(following), bet)))
+            else:
+                yield probability, following, None
+    return absorption_distribution(state, moves)
+
+def round_distribution(betting_strategy, min_bet=5):
+    ''' Exact distribution of a player's winnings after one round.
+
+    The player bets with betting_strategy through Player.make_bets at
+    every roll, and the round is played out through Board.  Bets must
+    only depend on the board status, as in the strategies in craps.py.
+    Returns a dict mapping winnings to their probability.
+    '''
+    def moves(current):
+        state, bets = current
+        board = board_in_state(state, min_bet)
+        board.bets = [Bet(bet_type, amount) for bet_type, amount in bets]
+        board.take_bets(Player(betting_strategy, None).make_bets(
+            board.get_status()))
+        bets = tuple((bet.bet_type, bet.amount) for bet in board.bets)
+        wagered = sum(amount for bet_type, amount in bets)
+        for roll, ways in __ways__.items():
+            board = board_in_state(state, min_bet)
+            board.bets = [Bet(bet_type, amount) for bet_type, amount in bets]
+            board.roll(roll)
+            if board.round_is_over:
+                payout = sum(exact(payout)
+                             for payout in board.return_payouts())
+                yield Fraction(ways, 36), None, payout - wagered
+            else:
+                yield Fraction(ways, 36), (board_state(board), bets), None
+    return absorption_distribution((board_state(Board(min_bet)), ()), moves)
+
+def bet_odds(state, bet):
+    ''' Exact odds of a bet placed in state, per unit wagered '''
+    amount = Fraction(bet.amount)
+    outcomes = {}
+    for payout, probability in payout_distribution(state, bet).items():
+        net = (payout - amount) / amount
+        outcomes[net] = outcomes.get(net, 0) + probability
+    expected_value = sum(net * p for net, p in outcomes.items())
+    return {'bet_type': bet.bet_type,
+            'point': state[0],
+            'point_just_set': state[1],
+            'p_win': sum(p for net, p in outcomes.items() if net > 0),
+            'p_lose': sum(p for net, p in outcomes.items() if net < 0),
+            'p_push': outcomes.get(0, Fraction(0)),
+            'expected_value': expected_value,
+            'house_edge': -expected_value,
+            'variance': sum((net - expected_value) ** 2 * p
+                            for net, p in outcomes.items()),
+            'outcomes': outcomes}
+
+def odds_table(bet_type, amount=10):
+    ''' Exact odds of a bet type in every state it can be placed in.
+
+    amount is the size of the bet used to compute payouts; choose it so
+    that no payout is rounded down (10 covers 2:1, 3:2 and 6:5 odds).
+    Returns a list of rows sorted by point, each a dict with the bet
+    type, point, point_just_set, p_win, p_lose, p_push, expected_value,
+    house_edge and variance (all per unit wagered, as Fractions), and
+    outcomes mapping each net result to its probability.
+    '''
+    if bet_type not in Bet.__bets__:
+        raise NotImplementedError('Bet ' + bet_type + ' not implemented')
+    entry = Bet.__bets__[bet_type]
+    key = (bet_type, entry['is_valid'], entry['get_payout'], amount)
+    if key not in __tables__:
+        bet = Bet(bet_type, amount)
+        rows = {}
+        for state in betting_states():
+            if state[:2] not in rows and \
+               entry['is_valid'](board_in_state(state), bet):
+                rows[state[:2]] = bet_odds(state, bet)
+        __tables__[key] = [rows[placement] for placement in sorted(rows)]
+    return __tables__[key]
+
+def odds_tables(amount=10):
+    ''' Odds tables for every registered bet type '''
+    return {bet_type: odds_table(bet_type, amount)
+            for bet_type in Bet.__bets__}
+
+def house_edge(bet_type, point=0, amount=10):
+    ''' Exact house edge of a bet placed with the given point '''
+    for row in odds_table(bet_type, amount):
+        if row['point'] == point:
+            return row['house_edge']
+    raise ValueError('Bet %s cannot be placed with point %s' %
+                     (bet_type, point))
@@ -0,0 +1,251 @@
+''' Craps population module.
+
+This module simulates a whole floor of players at once.  Rather than one
+Player (with its own Log and Board) per person, the population stores
+every player as a row in a set of typed NumPy columns, and steps all the
+active players through one roll at a time, grouped by betting strategy.
+
+The quitting rule is the one in quits_after_gainG_or_lossL_or_roundMax;
+each player carries their own gainG, lossL and roundMax columns.
+'''
+
+import numpy as np
+
+from craps import __free_odds__, bets_nothing, bets_pass, \
+                  bets_pass_and_odds
+
+
+def vbets_nothing(min_bet, come_out, point_just_set, point):
+    ''' Vectorized bets_nothing: no pass or odds bets, ever '''
+    zeros = np.zeros(len(min_bet), dtype=min_bet.dtype)
+    return zeros, zeros
+
+def vbets_pass(min_bet, come_out, point_just_set, point):
+    ''' Vectorized bets_pass: bet min_bet on pass at each come out roll '''
+    pass_amount = np.where(come_out, min_bet, 0).astype(min_bet.dtype)
+    return pass_amount, np.zeros(len(min_bet), dtype=min_bet.dtype)
+
+def vbets_pass_and_odds(min_bet, come_out, point_just_set, point):
+    ''' Vectorized bets_pass_and_odds: bet pass, then take the free odds '''
+    pass_amount = np.where(come_out, min_bet, 0).astype(min_bet.dtype)
+    den = __odds_den__[point]
+    odds_amount = np.where(point_just_set, -(-min_bet // den) * den, 0)
+    return pass_amount, odds_amount.astype(min_bet.dtype)
+
+
+# Lookup tables indexed by the point (0 and non-points map to a harmless 1)
+__odds_num__ = np.ones(13, dtype=np.int32)
+__odds_den__ = np.ones(13, dtype=np.int32)
+for _point, _odds in __free_odds__.items():
+    __odds_num__[_point] = _odds['num']
+    __odds_den__[_point] = _odds['den']
+
+# Round outcomes indexed by the roll
+__come_out_wins__ = np.isin(np.arange(13), [7, 11])
+__come_out_loses__ = np.isin(np.arange(13), [2, 3, 12])
+__is_point__ = np.isin(np.arange(13), [4, 5, 6, 8, 9, 10])
+
+
+def threshold_column(threshold, n):
+    ''' A gain or loss threshold as an int64 column.
+
+    Winnings are whole units, so a threshold is rounded up to the next
+    whole unit without changing who quits; inf maps to the int64 max.
+    '''
+    threshold = np.broadcast_to(threshold, n)
+    if np.issubdtype(threshold.dtype, np.integer):
+        return threshold.astype(np.int64)
+    threshold = np.ceil(threshold.astype(np.float64))
+    column = np.full(n, np.iinfo(np.int64).max, dtype=np.int64)
+    finite = threshold < 2.**63
+    column[finite] = np.maximum(threshold[finite], -2.**63)
+    return column
+
+
+class Population:
+    ''' The Population class runs a floor of players as NumPy columns '''
+    # List of supported strategies; each betting strategy function used
+    # with Player maps to a vectorized version of itself.  The strategy
+    # id stored per player is the index in this list.
+    __strategies__ = [(bets_nothing, vbets_nothing),
+                      (bets_pass, vbets_pass),
+                      (bets_pass_and_odds, vbets_pass_and_odds)]
+
+    def __init__(self, betting_strategies, min_bets=5,
+                 gainG=np.inf, lossL=np.inf, roundMax=np.iinfo(np.int32).max,
+                 seed=None):
+        ''' Create one player per entry in betting_strategies.
+
+        Every other argument is either a scalar shared by all players or
+        a sequence with one entry per player.
+        '''
+        ids = {fn: ii for ii, (fn, vfn) in enumerate(self.__strategies__)}
+        for fn in betting_strategies:
+            if fn not in ids:
+                raise NotImplementedError(
+                    'Strategy ' + fn.__name__ + ' has no vectorized version')
+        n = len(betting_strategies)
+        self.strategy = np.array([ids[fn] for fn in betting_strategies],
+                                 dtype=np.uint8)
+        min_bet = np.broadcast_to(min_bets, n)
+        if np.any(min_bet <= 0):
+            raise ValueError('Min bet must be positive')
+        if np.any(min_bet != np.floor(min_bet)):
+            raise ValueError('Min bet must be a whole number of units')
+        if np.any(min_bet > np.iinfo(np.int32).max):
+            raise ValueError('Min bet must fit in 32 bits')
+        self.min_bet = min_bet.astype(np.int32)
+        self.gainG = threshold_column(gainG, n)
+        self.lossL = threshold_column(np.abs(lossL), n)
+        # Round counts are int32, so an infinite roundMax is the int32 max
+        self.roundMax = np.minimum(threshold_column(roundMax, n),
+                                   np.iinfo(np.int32).max).astype(np.int32)
+
+        # Per-player Log and Board state
+        self.winnings = np.zeros(n, dtype=np.int64)
+        self.wagered = np.zeros(n, dtype=np.int64)
+        self.num_rounds = np.zeros(n, dtype=np.int32)
+        self.num_rolls = np.zeros(n, dtype=np.int32)
+        self.num_bets = np.zeros(n, dtype=np.int32)
+        self.point = np.zeros(n, dtype=np.int8)
+        self.point_just_set = np.zeros(n, dtype=bool)
+        self.pass_amount = np.zeros(n, dtype=np.int32)
+        self.odds_amount = np.zeros(n, dtype=np.int32)
+        self.active = np.ones(n, dtype=bool)
+
+        self.rng = np.random.default_rng(seed)
+        self.active_history = []
+
+    def __len__(self):
+        return len(self.strategy)
+
+    def __repr__(self):
+        return '<Population #players:%s #active:%s hold:%s>' % \
+               (len(self), self.num_active(), self.hold_percentage())
+
+    def nbytes(self):
+        ''' Total memory used by the per-player columns '''
+        return sum(column.nbytes for column in self.__dict__.values()
+                   if isinstance(column, np.ndarray))
+
+    def is_quitting(self):
+        ''' Vectorized quits_after_gainG_or_lossL_or_roundMax
+
+        Like the Player version, nobody quits before finishing a round.
+        '''
+        return (self.num_rounds > 0) & \
+               ((self.winnings <= -self.lossL) |
+                (self.winnings >= self.gainG) |
+                (self.num_rounds >= self.roundMax))
+
+    def step(self, rolls=None):
+        ''' Roll once for every active player.
+
+        Players at the start of a round first decide whether to quit.
+        If rolls is provided, it holds one roll per player (only the
+        active players' entries are used) -- this is useful for
+        debugging and for replaying dice streams.  Returns the number of
+        players still active.
+        '''
+        come_out = self.active & (self.point == 0)
+        self.active &= ~(come_out & self.is_quitting())
+        come_out &= self.active
+        idx = np.flatnonzero(self.active)
+        if len(idx) == 0:
+            self.active_history.append(0)
+            return 0
+
+        # Count the round and the roll, as in Player.make_bets()
+        self.num_rounds[come_out] += 1
+        self.num_rolls[idx] += 1
+
+        # Make bets, in vectorized groups by strategy
+        strategy = self.strategy[idx]
+        for sid in np.unique(strategy):
+            group = idx[strategy == sid]
+            new_pass, new_odds = self.__strategies__[sid][1](
+                self.min_bet[group], come_out[group],
+                self.point_just_set[group], self.point[group])
+            self.pass_amount[group] += new_pass
+            self.odds_amount[group] += new_odds
+            new_wagers = new_pass.astype(np.int64) + new_odds
+            self.winnings[group] -= new_wagers
+            self.wagered[group] += new_wagers
+            self.num_bets[group] += (new_pass > 0).astype(np.int32) + \
+                                    (new_odds > 0)
+
+        # Roll the dice, as in Board.roll()
+        if rolls is None:
+            roll = self.rng.integers(1, 7, len(idx), dtype=np.int8) + \
+                   self.rng.integers(1, 7, len(idx), dtype=np.int8)
+        else:
+            roll = np.asarray(rolls)[idx].astype(np.int8)
+        point = self.point[idx]
+        on_come_out = point == 0
+        self.point_just_set[idx] = on_come_out & __is_point__[roll]
+        self.point[idx] = np.where(self.point_just_set[idx], roll, point)
+
+        # Settle finished rounds, as in pass_get_payout() and
+        # pass_odds_get_payout()
+        won = np.where(on_come_out, __come_out_wins__[roll], roll == point)
+        lost = np.where(on_come_out, __come_out_loses__[roll], roll == 7)
+        over = idx[won | lost]
+        winners = idx[won]
+        odds_amount = self.odds_amount[winners].astype(np.int64)
+        self.winnings[winners] += \
+            2 * self.pass_amount[winners] + odds_amount + \
+            odds_amount * __odds_num__[self.point[winners]] // \
+            __odds_den__[self.point[winners]]
+        self.point[over] = 0
+        self.pass_amount[over] = 0
+        self.odds_amount[over] = 0
+
+        self.active_history.append(len(idx))
+        return len(idx)
+
+    def run(self, max_rolls=None):
+        ''' Step until every player has quit, or for at most max_rolls '''
+        n_rolls = 0
+        while (max_rolls is None or n_rolls < max_rolls) and self.step():
+            n_rolls = n_rolls + 1
+        return self
+
+    def num_active(self):
+        ''' Number of players still at the table '''
+        return int(np.count_nonzero(self.active))
+
+    def settled(self, players=slice(None)):
+        ''' Winnings and amounts wagered over settled rounds only '''
+        unsettled = self.pass_amount[players].astype(np.int64) + \
+                    self.odds_amount[players]
+        return self.winnings[players] + unsettled, \
+               self.wagered[players] - unsettled
+
+    def hold_percentage(self):
+        ''' Percentage of the total amount wagered kept by the house.
+
+        Bets on rounds still in progress are left out, so the hold is
+        meaningful mid-run too.
+        '''
+        winnings, wagered = self.settled()
+        total_wagered = wagered.sum()
+        if total_wagered == 0:
+            return 0.
+        return -100. * winnings.sum() / total_wagered
+
+    def summary(self):
+        ''' Aggregate metrics for each strategy on the floor '''
+        summary = {}
+        for sid in np.unique(self.strategy):
+            group = self.strategy == sid
+            winnings, wagered = self.settled(group)
+            wagered = wagered.sum()
+            summary[self.__strategies__[sid][0].__name__] = {
+                'players': int(group.sum()),
+                'active': int(np.count_nonzero(self.active[group])),
+                'mean_winnings': float(winnings.mean()),
+                'mean_rounds': float(self.num_rounds[group].mean()),
+                'mean_rolls': float(self.num_rolls[group].mean()),
+                'hold_percentage': float(-100. * winnings.sum() /
+                                         wagered) if wagered else 0.}
+        return summary
@@ -0,0 +1,213 @@
+''' Craps trace module.
+
+This module records every event at a Board -- each roll, each bet taken
+and each payout returned -- as fixed-width binary records.  Attach a
+Tracer to a board with board.tracer = Tracer(path); with no tracer, the
+board only pays for one attribute check per event.
+
+Each record is 16 bytes:
+    kind      uint8    ROLL, BET or PAYOUT
+    bet_type  uint8    index in the file's bet types (255 for rolls, and
+                       for bets registered after the trace was started)
+    roll      uint8    the last roll
+    point     uint8    the point (0 when not set)
+    round     uint32   round number, counted by the tracer
+    amount    int64    bet amount or payout (0 for rolls)
+
+The file starts with a header holding the list of bet types.  Traces are
+read back with TraceReader, which memory-maps the records and aggregates
+them in chunks, so traces larger than memory can be processed.
+'''
+
+import json
+import os
+import struct
+import warnings
+
+import numpy as np
+
+from craps import Bet
+
+ROLL = 0
+BET = 1
+PAYOUT = 2
+
+# Bet type of bets registered after the trace was started
+UNKNOWN = 'unknown'
+
+__magic__ = b'CRAPSTRC'
+__version__ = 2
+__record__ = struct.Struct('<BBBBIq')
+__dtype__ = np.dtype([('kind', 'u1'),
+                      ('bet_type', 'u1'),
+                      ('roll', 'u1'),
+                      ('point', 'u1'),
+                      ('round', '<u4'),
+                      ('amount', '<i8')])
+__no_bet_type__ = 255
+
+
+class Tracer:
+    ''' The Tracer class writes a board's events to a binary file '''
+    def __init__(self, path, buffer_size=2**16):
+        self.bet_types = list(Bet.__bets__)
+        self.bet_codes = {bet_type: ii
+                          for ii, bet_type in enumerate(self.bet_types)}
+        self.round = 0
+        self.num_records = 0
+        self.buffer_size = buffer_size
+        self.buffer = bytearray()
+        self.file = open(path, 'wb')
+
+        # Header: magic, version, header length, bet types as JSON,
+        # padded so the records are aligned
+        bet_types = json.dumps(self.bet_types).encode()
+        length = len(__magic__) + 8 + len(bet_types)
+        length = length + (-length) % __record__.size
+        header = __magic__ + struct.pack('<II', __version__, length) + \
+                 bet_types
+        self.file.write(header.ljust(length, b' '))
+
+    def __repr__(self):
+        return '<Tracer %s #records:%s>' % (self.file.name, self.num_records)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def write(self, kind, bet_type, board, amount):
+        self.buffer += __record__.pack(kind, bet_type, board.last_roll,
+                                       board.point, self.round, amount)
+        self.num_records = self.num_records + 1
+        if len(self.buffer) >= self.buffer_size:
+            self.flush()
+
+    def roll(self, board):
+        ''' Record a roll of the dice '''
+        self.write(ROLL, __no_bet_type__, board, 0)
+
+    def bet(self, board, bet):
+        ''' Record a bet taken by the board '''
+        self.write(BET, self.bet_codes.get(bet.bet_type, __no_bet_type__),
+                   board, bet.amount)
+
+    def payouts(self, board, payouts):
+        ''' Record the payouts of the round's bets, and end the round '''
+        for bet, payout in zip(board.bets, payouts):
+            self.write(PAYOUT,
+                       self.bet_codes.get(bet.bet_type, __no_bet_type__),
+                       board, payout)
+        self.round = self.round + 1
+
+    def flush(self):
+        ''' Write out the buffered records '''
+        self.file.write(self.buffer)
+        self.buffer = bytearray()
+        self.file.flush()
+
+    def close(self):
+        ''' Flush and close the trace file '''
+        if not self.file.closed:
+            self.flush()
+            self.file.close()
+
+
+class TraceReader:
+    ''' The TraceReader class reads a trace file without loading it '''
+    def __init__(self, path, chunk_size=2**22):
+        with open(path, 'rb') as trace:
+            header = trace.read(len(__magic__) + 8)
+            if header[:len(__magic__)] != __magic__:
+                raise ValueError(path + ' is not a craps trace')
+            if len(header) < len(__magic__) + 8:
+                raise ValueError(path + ' has a truncated header')
+            version, length = struct.unpack('<II', header[len(__magic__):])
+            if version != __version__:
+                raise ValueError('Unsupported trace version %s' % version)
+            self.bet_types = json.loads(
+                trace.read(length - len(header)).decode())
+        self.chunk_size = chunk_size
+        size = os.path.getsize(path)
+        if size < length:
+            raise ValueError(path + ' has a truncated header')
+        num_records, partial = divmod(size - length, __record__.size)
+        if partial:
+            # The writer stopped mid-record (a crash, or a full disk)
+            warnings.warn('%s ends with a partial record of %s bytes, '
+                          'which is ignored' % (path, partial))
+        if num_records:
+            self.records = np.memmap(path, dtype=__dtype__, mode='r',
+                                     offset=length, shape=(num_records,))
+        else:
+            # An empty trace cannot be memory-mapped
+            self.records = np.zeros(0, dtype=__dtype__)
+
+    def __len__(self):
+        return len(self.records)
+
+    def __repr__(self):
+        return '<TraceReader #records:%s>' % len(self)
+
+    def chunks(self):
+        ''' Iterate over the records, one chunk at a time '''
+        for start in range(0, len(self.records), self.chunk_size):
+            yield self.records[start:start + self.chunk_size]
+
+    def bet_code(self, bet_type):
+        ''' Code of a bet type in this trace; UNKNOWN for bets registered
+        after the trace was started '''
+        if bet_type == UNKNOWN:
+            return __no_bet_type__
+        if bet_type not in self.bet_types:
+            raise ValueError('Bet %s is not in this trace' % bet_type)
+        return self.bet_types.index(bet_type)
+
+    def mask(self, chunk, kind=None, bet_type=None):
+        ''' Select the records of a chunk by kind and bet type '''
+        selected = np.ones(len(chunk), dtype=bool)
+        if kind is not None:
+            selected &= chunk['kind'] == kind
+        if bet_type is not None:
+            selected &= chunk['bet_type'] == self.bet_code(bet_type)
+        return selected
+
+    def count(self, kind=None, bet_type=None):
+        ''' Number of records of the given kind and bet type '''
+        return sum(int(np.count_nonzero(self.mask(chunk, kind, bet_type)))
+                   for chunk in self.chunks())
+
+    def select(self, kind=None, bet_type=None):
+        ''' Copy out the records of the given kind and bet type '''
+        selected = [chunk[self.mask(chunk, kind, bet_type)]
+                    for chunk in self.chunks()]
+        return np.concatenate(selected) if selected else \
+               np.zeros(0, dtype=__dtype__)
+
+    def roll_histogram(self):
+        ''' Number of times each total (0 to 12) was rolled '''
+        histogram = np.zeros(13, dtype=np.int64)
+        for chunk in self.chunks():
+            histogram += np.bincount(chunk['roll'][chunk['kind'] == ROLL],
+                                     minlength=13)[:13]
+        return histogram
+
+    def totals(self, kind):
+        ''' Total amount of the given kind (BET or PAYOUT) per bet type.
+
+        Bets of types registered after the trace was started are totaled
+        under UNKNOWN, which is only present if there are any.
+        '''
+        sums = np.zeros(256, dtype=np.int64)
+        unknown = 0
+        for chunk in self.chunks():
+            selected = chunk[chunk['kind'] == kind]
+            np.add.at(sums, selected['bet_type'], selected['amount'])
+            unknown = unknown + int(np.count_nonzero(
+                selected['bet_type'] == __no_bet_type__))
+        totals = {bet_type: int(sums[ii])
+                  for ii, bet_type in enumerate(self.bet_types)}
+        if unknown:
+            totals[UNKNOWN] = int(sums[__no_bet_type__])
+        return totals